@@ -1,14 +1,16 @@
 # cli/main.py
 
-import typer
-from typing_extensions import Annotated
+import argparse
 import logging
+import os
 import sys
 import csv
+import tempfile
+from typing import Iterable, List, Optional
 
-from get_papers_list import api, processing
+import requests
 
-app = typer.Typer()
+from get_papers_list import api, processing
 
 def setup_logging(debug: bool):
     """Configures logging based on the debug flag."""
@@ -19,95 +21,157 @@ def setup_logging(debug: bool):
         stream=sys.stderr,  # Log to stderr to not interfere with CSV output to stdout
     )
 
-def write_to_csv(data: list, file_path: str = None):
-    """Writes the filtered paper data to a CSV file or stdout."""
-    if not data:
-        logging.info("No data to write.")
-        return
-        
+# Output file buffer size; the buffer is what coalesces the per-row writes.
+WRITE_BUFFER_SIZE = 1 << 20
+
+def _row(paper) -> list:
+    """Builds a single CSV row for a filtered paper."""
+    return [
+        paper.pubmed_id, # [cite: 12]
+        paper.title, # [cite: 13]
+        paper.publication_date, # [cite: 14]
+        paper.non_academic_authors, # [cite: 15]
+        paper.company_affiliations, # [cite: 16]
+        paper.corresponding_author_email or "N/A", # [cite: 16]
+    ]
+
+def _open_temp_output(file_path: str):
+    """
+    Opens a temporary file next to `file_path` for the results, so the target is
+    only replaced once the whole run has succeeded.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp"
+    )
+    # mkstemp creates the file as 0600; give it the mode a plain open() would.
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temp_path, 0o666 & ~umask)
+    return os.fdopen(fd, 'w', newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE), temp_path
+
+def write_to_csv(data: Iterable, file_path: str = None) -> int:
+    """
+    Streams the filtered paper data to a CSV file or stdout as it is produced.
+    Returns the number of rows written (excluding the header).
+
+    A file is written to a temporary path and moved into place only if at least
+    one row was written without errors; otherwise an existing file is left alone.
+    """
     # Use the fields from the dataclass as headers
     headers = [
         "PubmedID", "Title", "Publication Date", 
         "Non-academic Author(s)", "Company Affiliation(s)", "Corresponding Author Email"
     ]
     
-    output_target = open(file_path, 'w', newline='', encoding='utf-8') if file_path else sys.stdout
-    
-    writer = csv.writer(output_target)
-    writer.writerow(headers) # Write header [cite: 11]
-    
-    for paper in data:
-        writer.writerow([
-            paper.pubmed_id, # [cite: 12]
-            paper.title, # [cite: 13]
-            paper.publication_date, # [cite: 14]
-            paper.non_academic_authors, # [cite: 15]
-            paper.company_affiliations, # [cite: 16]
-            paper.corresponding_author_email or "N/A", # [cite: 16]
-        ])
-        
     if file_path:
-        output_target.close()
+        output_target, temp_path = _open_temp_output(file_path)
+    else:
+        output_target, temp_path = sys.stdout, None
+    count = 0
+
+    def counted_rows():
+        nonlocal count
+        for paper in data:
+            count += 1
+            yield _row(paper)
+
+    try:
+        writer = csv.writer(output_target)
+        writer.writerow(headers) # Write header [cite: 11]
+        writer.writerows(counted_rows())
+        if temp_path:
+            output_target.close()
+            if count:
+                os.replace(temp_path, file_path)
+    finally:
+        if temp_path:
+            output_target.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)  # Error or no results: discard the partial output
+
+    if file_path and count:
         logging.info(f"Results successfully saved to {file_path}")
+    return count
 
-@app.command()
-def main(
-    query: Annotated[str, typer.Argument(help="The full query to search on PubMed.")],
-    file: Annotated[
-        str,
-        typer.Option(
-            "-f", "--file",
-            help="Specify the filename to save the results. Prints to console if not provided."
-        ),
-    ] = None,
-    debug: Annotated[
-        bool,
-        typer.Option(
-            "-d", "--debug",
-            help="Print debug information during execution."
-        ),
-    ] = False,
-):
+def main(query: str, file: str = None, debug: bool = False, api_key: str = None) -> int:
     """
     Fetches research papers from PubMed based on a query, filters for authors
     from pharmaceutical or biotech companies, and returns the results as a CSV.
+    Returns the process exit code.
     """
     setup_logging(debug)
     
     try:
         logging.info("Starting paper retrieval process...")
-        # 1. Search for papers
-        pmids = api.search_pubmed(query)
-        if not pmids:
+        # 1. Search for papers, keeping the PMIDs on the NCBI history server
+        history = api.search_pubmed_history(query, api_key=api_key)
+        if not history.count:
             logging.warning("No papers found for the given query.")
-            typer.echo("No papers found.")
-            raise typer.Exit()
+            print("No papers found.", file=sys.stderr)
+            return 0
             
-        # 2. Fetch paper details
-        xml_data = api.fetch_paper_details(pmids)
+        # 2. Fetch paper details (in concurrent batches)
+        xml_batches = api.fetch_history_details(history, api_key=api_key)
         
-        # 3. Parse XML data
-        papers = processing.parse_pubmed_xml(xml_data)
+        # 3. Parse XML data (lazily, one article at a time), skipping articles
+        #    that cannot have a non-academic author
+        papers = (
+            paper
+            for xml_data in xml_batches
+            for paper in processing.iter_pubmed(xml_data, non_academic_only=True)
+        )
         
         # 4. Filter for non-academic affiliations
         filtered_papers = processing.filter_papers_by_affiliation(papers)
         
-        # 5. Write output
-        if not filtered_papers:
+        # 5. Write output; parsing, filtering and writing happen in a single pass
+        if not write_to_csv(filtered_papers, file):
             logging.warning("No papers with non-academic authors found.")
-            typer.echo("Found papers, but none matched the non-academic author criteria.")
-            raise typer.Exit()
-
-        write_to_csv(filtered_papers, file)
+            print("Found papers, but none matched the non-academic author criteria.", file=sys.stderr)
+        return 0
 
     except requests.exceptions.RequestException as e:
         logging.error(f"An API error occurred: {e}")
-        typer.echo(f"Error: Could not connect to PubMed API. Please check your connection.", err=True)
-        raise typer.Exit(code=1)
+        print("Error: Could not connect to PubMed API. Please check your connection.", file=sys.stderr)
+        return 1
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}", exc_info=debug)
-        typer.echo(f"An unexpected error occurred: {e}", err=True)
-        raise typer.Exit(code=1)
+        print(f"An unexpected error occurred: {e}", file=sys.stderr)
+        return 1
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the command-line parser. Plain argparse keeps startup fast: typer
+    pulls in click and rich on every invocation for just these few options.
+    """
+    parser = argparse.ArgumentParser(
+        prog="get-papers-list",
+        description=(
+            "Fetches research papers from PubMed based on a query, filters for authors "
+            "from pharmaceutical or biotech companies, and returns the results as a CSV."
+        ),
+    )
+    parser.add_argument("query", help="The full query to search on PubMed.")
+    parser.add_argument(
+        "-f", "--file",
+        help="Specify the filename to save the results. Prints to console if not provided.",
+    )
+    parser.add_argument(
+        "-d", "--debug", action="store_true",
+        help="Print debug information during execution.",
+    )
+    parser.add_argument(
+        "--api-key", default=os.environ.get("NCBI_API_KEY"),
+        help="NCBI API key; raises the allowed request rate from 3/s to 10/s. "
+             "Defaults to the NCBI_API_KEY environment variable.",
+    )
+    return parser
+
+def app(argv: Optional[List[str]] = None) -> None:
+    """Console-script entry point."""
+    args = build_parser().parse_args(argv)
+    sys.exit(main(args.query, args.file, args.debug, args.api_key))
 
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    app()
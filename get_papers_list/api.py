@@ -1,13 +1,82 @@
 # get_papers_list/api.py
 
 import requests
-from typing import List, Dict, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import List, Dict, Any, Iterator, Optional
+import json
 import logging
+import threading
+import time
+
+from .models import SearchHistory
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up; fall back to the standard library
+    orjson = None
 
 BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+USER_AGENT = "get_papers_project/0.1.0"
+# NCBI E-utilities request limits, per second, without and with an API key.
+RATE_LIMIT = 3
+RATE_LIMIT_WITH_KEY = 10
 logger = logging.getLogger(__name__)
 
-def search_pubmed(query: str, max_papers: int = 100) -> List[str]:
+
+def _build_session() -> requests.Session:
+    """
+    Creates the shared HTTP session: keep-alive connections are reused between
+    the esearch and efetch calls, and transient failures are retried with backoff.
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"GET", "POST"}),  # efetch POSTs are idempotent
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+
+_SESSION = _build_session()
+
+
+class _RateLimiter:
+    """Thread-safe limiter that spaces requests evenly at a given rate."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self, rate: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + 1.0 / rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+_rate_limiter = _RateLimiter()
+
+
+def _throttle(api_key: Optional[str]) -> None:
+    """Blocks until another request to NCBI is allowed."""
+    _rate_limiter.wait(RATE_LIMIT_WITH_KEY if api_key else RATE_LIMIT)
+
+
+def _loads(content: bytes) -> Dict[str, Any]:
+    """Decodes a JSON response body, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+def search_pubmed(query: str, max_papers: int = 100, api_key: Optional[str] = None) -> List[str]:
     """
     Searches PubMed for a query and returns a list of matching PubMed IDs (PMIDs).
     """
@@ -19,10 +88,13 @@ def search_pubmed(query: str, max_papers: int = 100) -> List[str]:
         "retmax": max_papers,
     }
     logger.debug(f"Searching PubMed with URL: {search_url} and params: {params}")
+    if api_key:
+        params["api_key"] = api_key
     try:
-        response = requests.get(search_url, params=params)
+        _throttle(api_key)
+        response = _SESSION.get(search_url, params=params)
         response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
-        data = response.json()
+        data = _loads(response.content)
         pmids = data.get("esearchresult", {}).get("idlist", [])
         logger.info(f"Found {len(pmids)} paper(s) for query: '{query}'")
         return pmids
@@ -30,25 +102,112 @@ def search_pubmed(query: str, max_papers: int = 100) -> List[str]:
         logger.error(f"PubMed API search failed: {e}")
         raise
 
-def fetch_paper_details(pmids: List[str]) -> str:
+def search_pubmed_history(query: str, max_papers: int = 100, api_key: Optional[str] = None) -> SearchHistory:
     """
-    Fetches detailed information for a list of PMIDs from PubMed in XML format.
+    Searches PubMed for a query, keeping the matching PMIDs on the NCBI history
+    server instead of returning them. Use with fetch_history_details.
     """
-    if not pmids:
-        return ""
-    
+    search_url = f"{BASE_URL}esearch.fcgi"
+    params = {
+        "db": "pubmed",
+        "term": query,
+        "retmode": "json",
+        "retmax": 0,  # The IDs stay server-side; only the count is needed
+        "usehistory": "y",
+    }
+    logger.debug(f"Searching PubMed with URL: {search_url} and params: {params}")
+    if api_key:
+        params["api_key"] = api_key
+    try:
+        _throttle(api_key)
+        response = _SESSION.get(search_url, params=params)
+        response.raise_for_status()
+        result = _loads(response.content).get("esearchresult", {})
+        history = SearchHistory(
+            webenv=result.get("webenv", ""),
+            query_key=result.get("querykey", ""),
+            count=min(int(result.get("count", 0)), max_papers),
+        )
+        logger.info(f"Found {history.count} paper(s) for query: '{query}'")
+        return history
+    except requests.exceptions.RequestException as e:
+        logger.error(f"PubMed API search failed: {e}")
+        raise
+
+def _fetch_chunk(params: Dict[str, Any], api_key: Optional[str]) -> bytes:
+    """Runs one efetch request and returns the raw XML response body."""
     fetch_url = f"{BASE_URL}efetch.fcgi"
     params = {
         "db": "pubmed",
-        "id": ",".join(pmids),
+        **params,
         "retmode": "xml",
         "rettype": "abstract",
     }
-    logger.debug(f"Fetching details for {len(pmids)} PMIDs.")
+    if api_key:
+        params["api_key"] = api_key
+    _throttle(api_key)
+    response = _SESSION.post(fetch_url, data=params) # Use POST for long lists of IDs
+    response.raise_for_status()
+    # Bytes, not response.text: lxml decodes using the XML prolog itself.
+    return response.content
+
+def _fetch_batches(
+    batches: List[Dict[str, Any]], workers: int, api_key: Optional[str]
+) -> Iterator[bytes]:
+    """Runs the efetch batches concurrently, yielding bodies in batch order."""
+    if not batches:
+        return
+
     try:
-        response = requests.post(fetch_url, data=params) # Use POST for long lists of IDs
-        response.raise_for_status()
-        return response.text
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Keep at most `workers` requests in flight ahead of the consumer.
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(_fetch_chunk, batch, api_key))
+                if len(pending) >= workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
     except requests.exceptions.RequestException as e:
         logger.error(f"PubMed API fetch failed: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def fetch_paper_details(
+    pmids: List[str],
+    chunk_size: int = 50,
+    workers: int = 3,
+    api_key: Optional[str] = None,
+) -> Iterator[bytes]:
+    """
+    Fetches detailed information for a list of PMIDs from PubMed in XML format.
+    PMIDs are split into batches of `chunk_size` that are downloaded concurrently;
+    one raw XML body is yielded per batch, in the original order.
+    """
+    logger.debug(f"Fetching details for {len(pmids)} PMIDs.")
+    batches = [
+        {"id": ",".join(pmids[i:i + chunk_size])}
+        for i in range(0, len(pmids), chunk_size)
+    ]
+    yield from _fetch_batches(batches, workers, api_key)
+
+def fetch_history_details(
+    history: SearchHistory,
+    chunk_size: int = 50,
+    workers: int = 3,
+    api_key: Optional[str] = None,
+) -> Iterator[bytes]:
+    """
+    Like fetch_paper_details, but pages through a search_pubmed_history result
+    with retstart/retmax so no PMIDs have to be sent in the request body.
+    """
+    logger.debug(f"Fetching details for {history.count} paper(s) from the history server.")
+    batches = [
+        {
+            "WebEnv": history.webenv,
+            "query_key": history.query_key,
+            "retstart": start,
+            "retmax": min(chunk_size, history.count - start),
+        }
+        for start in range(0, history.count, chunk_size)
+    ]
+    yield from _fetch_batches(batches, workers, api_key)
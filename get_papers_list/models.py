@@ -0,0 +1,41 @@
+# get_papers_list/models.py
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# slots=True: one instance is allocated per author / article, so dropping the
+# per-instance __dict__ keeps them small and attribute access fast.
+
+@dataclass(slots=True)
+class Author:
+    """An author of a paper as listed in the PubMed record."""
+    last_name: Optional[str]
+    fore_name: Optional[str]
+    initials: Optional[str]
+    affiliation: Optional[str]
+
+@dataclass(slots=True)
+class Paper:
+    """A paper parsed from the PubMed efetch XML."""
+    pmid: str
+    title: str
+    publication_date: str
+    authors: List[Author] = field(default_factory=list)
+    corresponding_author_email: Optional[str] = None
+
+@dataclass(slots=True)
+class FilteredPaper:
+    """A paper with at least one non-academic author, ready for CSV output."""
+    pubmed_id: str
+    title: str
+    publication_date: str
+    non_academic_authors: str
+    company_affiliations: str
+    corresponding_author_email: Optional[str] = None
+
+@dataclass(slots=True)
+class SearchHistory:
+    """An esearch result set stored on the NCBI history server (usehistory=y)."""
+    webenv: str
+    query_key: str
+    count: int
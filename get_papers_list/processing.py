@@ -1,7 +1,11 @@
 # get_papers_list/processing.py
 
+import functools
+import io
+import re
+import sys
 from lxml import etree
-from typing import List, Tuple, Optional
+from typing import Iterable, Iterator, List, Tuple, Optional
 import logging
 from .models import Author, Paper, FilteredPaper
 
@@ -17,20 +21,50 @@ COMPANY_KEYWORDS = [
     'biopharma', 'biotech', 'diagnostics', 'ventures', 'llc'
 ]
 
+# Keyword lists compiled once into single alternations so each affiliation is
+# scanned in one pass by the regex engine rather than once per keyword.
+# Case-insensitive, so affiliations never need a lowercased copy.
+_COMPANY_RE = re.compile(r"[ ,](?:" + "|".join(map(re.escape, COMPANY_KEYWORDS)) + ")", re.IGNORECASE)
+_ACADEMIC_RE = re.compile("|".join(map(re.escape, ACADEMIC_KEYWORDS)), re.IGNORECASE)
 
+# Compiled once so lxml doesn't re-parse the expression for every article.
+# String results are returned as plain str rather than lxml "smart" strings.
+_PMID = etree.XPath("string(.//PMID)", smart_strings=False)
+_TITLE = etree.XPath("string(.//ArticleTitle)", smart_strings=False)
+_AUTHORLIST = etree.XPath(".//AuthorList")
+_AUTHORS = etree.XPath(".//Author")
+_PUBDATE = etree.XPath(".//PubDate")
+_LAST_NAME = etree.XPath("string(LastName)", smart_strings=False)
+_FORE_NAME = etree.XPath("string(ForeName)", smart_strings=False)
+_INITIALS = etree.XPath("string(Initials)", smart_strings=False)
+_AFFILIATION = etree.XPath("(.//Affiliation)[1]")
+# Inline elements inside <Affiliation> that hold footnote labels, not text.
+_AFFILIATION_LABEL_TAGS = frozenset({"sup"})
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+# Parser settings for efetch XML: no ID table, no entity expansion or network
+# access, and no libxml2 size limits on very large responses.
+_PARSER_OPTIONS = dict(
+    collect_ids=False,
+    resolve_entities=False,
+    no_network=True,
+    huge_tree=True,
+)
+
+
+# The same affiliation string recurs across co-authors and papers, so memoize.
+@functools.lru_cache(maxsize=4096)
 def _is_non_academic(affiliation: str) -> bool:
     """Determines if an affiliation is non-academic based on keywords."""
     if not affiliation:
         return False
     
-    lower_aff = affiliation.lower()
-    
     # It is likely a company if it contains a corporate keyword.
-    if any(f' {kw}' in lower_aff or f',{kw}' in lower_aff for kw in COMPANY_KEYWORDS):
+    if _COMPANY_RE.search(affiliation):
         return True
         
     # It is likely academic if it contains an academic keyword.
-    if any(kw in lower_aff for kw in ACADEMIC_KEYWORDS):
+    if _ACADEMIC_RE.search(affiliation):
         return False
         
     # If no keywords match, assume it's non-academic (heuristic).
@@ -39,84 +73,146 @@ def _is_non_academic(affiliation: str) -> bool:
 
 def _parse_publication_date(article_node: etree._Element) -> str:
     """Extracts the publication date from the XML node."""
-    pub_date_node = article_node.find(".//PubDate")
-    if pub_date_node is not None:
-        year = pub_date_node.findtext("Year", "N/A")
-        month = pub_date_node.findtext("Month", "N/A")
-        day = pub_date_node.findtext("Day", "N/A")
-        return f"{year}-{month}-{day}"
+    pub_date_nodes = _PUBDATE(article_node)
+    if pub_date_nodes:
+        # PubDate has only a handful of children, so collect them in one pass.
+        parts = {child.tag: child.text or "" for child in pub_date_nodes[0]}
+        if "Year" not in parts and "MedlineDate" in parts:
+            return parts["MedlineDate"]  # Free-form dates such as "2023 Mar-Apr"
+        return f"{parts.get('Year', 'N/A')}-{parts.get('Month', 'N/A')}-{parts.get('Day', 'N/A')}"
     return "No Date Found"
 
 def _find_corresponding_email(author_list_node: etree._Element) -> Optional[str]:
     """Scans author affiliations for an email address."""
-    for affiliation in author_list_node.xpath(".//Affiliation/text()"):
-        # A simple regex could be more robust, but this is a common pattern.
-        parts = [part for part in affiliation.split() if '@' in part]
-        if parts:
-            email = parts[0].strip('.,;()[]')
-            return email
+    # iter() walks the tree lazily, so the scan stops at the first email found.
+    # itertext() also covers text after inline markup such as <sup> or <i>.
+    for affiliation_node in author_list_node.iter("Affiliation"):
+        match = _EMAIL_RE.search("".join(affiliation_node.itertext()))
+        if match:
+            return match.group(0)
     return None
 
-def parse_pubmed_xml(xml_data: str) -> List[Paper]:
-    """Parses the XML response from PubMed efetch into a list of Paper objects."""
-    if not xml_data:
-        return []
+def _affiliation_text(author_node: etree._Element) -> str:
+    """
+    Returns the author's first affiliation, keeping text after inline markup
+    but dropping footnote labels such as <sup>1</sup>.
+    """
+    affiliation_nodes = _AFFILIATION(author_node)
+    if not affiliation_nodes:
+        return ""
+    affiliation_node = affiliation_nodes[0]
+    parts = [affiliation_node.text or ""]
+    for child in affiliation_node:
+        if child.tag not in _AFFILIATION_LABEL_TAGS:
+            parts.extend(child.itertext())
+        parts.append(child.tail or "")
+    return "".join(parts).strip()
 
-    root = etree.fromstring(xml_data.encode('utf-8'))
-    papers = []
+def _has_non_academic_author(affiliations: List[str]) -> bool:
+    """Cheaply checks whether any author's affiliation looks non-academic."""
+    return any(_is_non_academic(affiliation) for affiliation in affiliations)
+
+def _parse_article(article_node: etree._Element, non_academic_only: bool) -> Optional[Paper]:
+    """
+    Builds a Paper from a <PubmedArticle> node. With `non_academic_only`, returns
+    None without building any Author objects if no author can pass the filter.
+    """
+    author_list_nodes = _AUTHORLIST(article_node)
+    author_list_node = author_list_nodes[0] if author_list_nodes else None
+    author_nodes = _AUTHORS(author_list_node) if author_list_node is not None else []
+    # Evaluated once per author and shared by the prescreen and the Author objects.
+    # Interned: the same affiliation recurs across authors and papers.
+    affiliations = [sys.intern(_affiliation_text(author_node)) for author_node in author_nodes]
+
+    if non_academic_only and not _has_non_academic_author(affiliations):
+        return None
+
+    pmid = _PMID(article_node) or "N/A"
+    title = _TITLE(article_node) or "No Title Found"
+    pub_date = _parse_publication_date(article_node)
     
-    for article_node in root.xpath("//PubmedArticle"):
-        pmid = article_node.findtext(".//PMID", "N/A")
-        title = article_node.findtext(".//ArticleTitle", "No Title Found")
-        pub_date = _parse_publication_date(article_node)
-        
-        authors = []
-        author_list_node = article_node.find(".//AuthorList")
-        email = None
-        if author_list_node is not None:
-            email = _find_corresponding_email(author_list_node)
-            for author_node in author_list_node.xpath(".//Author"):
-                authors.append(
-                    Author(
-                        last_name=author_node.findtext("LastName"),
-                        fore_name=author_node.findtext("ForeName"),
-                        initials=author_node.findtext("Initials"),
-                        affiliation=author_node.findtext(".//Affiliation"),
-                    )
+    authors = []
+    email = None
+    if author_list_node is not None:
+        email = _find_corresponding_email(author_list_node)
+        for author_node, affiliation in zip(author_nodes, affiliations):
+            authors.append(
+                Author(
+                    last_name=_LAST_NAME(author_node),
+                    fore_name=_FORE_NAME(author_node),
+                    initials=_INITIALS(author_node),
+                    affiliation=affiliation,
                 )
+            )
 
-        papers.append(Paper(pmid=pmid, title=title, publication_date=pub_date, authors=authors, corresponding_author_email=email))
+    return Paper(pmid=pmid, title=title, publication_date=pub_date, authors=authors, corresponding_author_email=email)
+
+def iter_pubmed(xml_data: bytes, non_academic_only: bool = False) -> Iterator[Paper]:
+    """
+    Incrementally parses the XML response from PubMed efetch, yielding one
+    Paper object per <PubmedArticle> so memory stays flat in the number of articles.
+
+    With `non_academic_only`, articles that filter_papers_by_affiliation would
+    certainly reject are skipped before any of their authors are materialized.
+    """
+    if not xml_data:
+        return
+
+    count = 0
+    skipped = 0
+    source = io.BytesIO(xml_data)
+    for _, article_node in etree.iterparse(source, events=("end",), tag="PubmedArticle", **_PARSER_OPTIONS):
+        paper = _parse_article(article_node, non_academic_only)
+
+        # Free the processed article and any already-handled siblings.
+        article_node.clear()
+        while article_node.getprevious() is not None:
+            del article_node.getparent()[0]
+
+        count += 1
+        if paper is None:
+            skipped += 1
+            continue
+        yield paper
+    
+    logger.info(f"Parsed {count} paper(s) from XML data.")
+    if skipped:
+        logger.debug(f"Skipped {skipped} paper(s) with no possible non-academic author.")
+
+def _classify_paper(paper: Paper) -> Optional[FilteredPaper]:
+    """Returns the FilteredPaper for a paper with non-academic authors, else None."""
+    non_academic_authors = []
+    # Ordered de-duplication, keeping the affiliations in author order.
+    company_affiliations: dict[str, None] = {}
+
+    for author in paper.authors:
+        if author.affiliation and _is_non_academic(author.affiliation):
+            author_name = f"{author.fore_name or ''} {author.last_name or ''}".strip()
+            if author_name:
+                non_academic_authors.append(author_name)
+                company_affiliations[author.affiliation] = None
     
-    logger.info(f"Parsed {len(papers)} paper(s) from XML data.")
-    return papers
+    if not non_academic_authors:
+        return None
+    return FilteredPaper(
+        pubmed_id=paper.pmid,
+        title=paper.title.strip(),
+        publication_date=paper.publication_date,
+        non_academic_authors="; ".join(non_academic_authors),
+        company_affiliations="; ".join(company_affiliations),
+        corresponding_author_email=paper.corresponding_author_email,
+    )
 
-def filter_papers_by_affiliation(papers: List[Paper]) -> List[FilteredPaper]:
+def filter_papers_by_affiliation(papers: Iterable[Paper]) -> Iterator[FilteredPaper]:
     """
-    Filters a list of papers to find those with non-academic authors.
+    Lazily filters an iterable of papers, yielding those with non-academic authors.
     """
-    filtered_list = []
+    count = 0
     for paper in papers:
-        non_academic_authors = []
-        company_affiliations = set()
-
-        for author in paper.authors:
-            if author.affiliation and _is_non_academic(author.affiliation):
-                author_name = f"{author.fore_name or ''} {author.last_name or ''}".strip()
-                if author_name:
-                    non_academic_authors.append(author_name)
-                    company_affiliations.add(author.affiliation)
-        
-        if non_academic_authors:
-            filtered_list.append(
-                FilteredPaper(
-                    pubmed_id=paper.pmid,
-                    title=paper.title.strip(),
-                    publication_date=paper.publication_date,
-                    non_academic_authors="; ".join(non_academic_authors),
-                    company_affiliations="; ".join(sorted(list(company_affiliations))),
-                    corresponding_author_email=paper.corresponding_author_email,
-                )
-            )
+        filtered = _classify_paper(paper)
+        if filtered is not None:
+            count += 1
+            yield filtered
             
-    logger.info(f"Found {len(filtered_list)} paper(s) with non-academic authors.")
-    return filtered_list
\ No newline at end of file
+    logger.info(f"Found {count} paper(s) with non-academic authors.")
+    logger.debug(f"Affiliation classification cache: {_is_non_academic.cache_info()}")